@@ -1,8 +1,12 @@
-import json
+import atexit
+import itertools
+import queue
 import time
 import threading
 import concurrent.futures
 import sqlite3
+
+import orjson
 from abc import ABC, abstractmethod
 from typing import Optional
 
@@ -11,6 +15,39 @@ from freshservice_api import FreshserviceApi
 class BaseBatchProcessor(ABC):
     entity_label = "Entity"
 
+    # Subclasses provide the UPDATE statements executed (via executemany) when
+    # buffered results are flushed.
+    mark_success_sql = ""
+    mark_failure_sql = ""
+
+    # All 16 possible rate-limit bars, built once instead of two string
+    # multiplications and a concat per progress line.
+    _BAR_LEN = 15
+    _BARS = ['█' * i + '-' * (15 - i) for i in range(16)]
+
+    @staticmethod
+    def apply_pragmas(db: sqlite3.Connection):
+        """
+        Tune the connection for many threads hammering the same database file:
+        WAL so readers never block the writer, fewer fsyncs, and a bigger cache.
+        journal_mode persists in the database file; the others are per-connection.
+
+        WAL2 (two rotating WAL files, so checkpoints never block writers) is
+        preferred when the linked SQLite is a WAL2-enabled build; stock builds
+        ignore the unknown mode and we fall back to plain WAL.
+        """
+        journal_mode = db.execute("PRAGMA journal_mode=WAL2").fetchone()[0]
+        if journal_mode.lower() != "wal2":
+            db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA wal_autocheckpoint=10000")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA temp_store=MEMORY")
+        db.execute("PRAGMA cache_size=-64000")
+        db.execute("PRAGMA busy_timeout=30000")
+        # 1 GiB mmap ceiling: full-table reads (e.g. prepare) come straight
+        # from the OS page cache with no user-space copy
+        db.execute("PRAGMA mmap_size=1073741824")
+
     def __init__(self, fs_api: FreshserviceApi, db_filename: str):
         self.fs_api = fs_api
         self.db_filename = db_filename
@@ -21,12 +58,93 @@ class BaseBatchProcessor(ABC):
         self.failure_count = 0
         self.start_time = None
         self.count_lock = threading.Lock()
-        self.print_lock = threading.Lock()
+        # count.__next__ is atomic under the GIL, so workers draw completion
+        # totals without taking a lock per item
+        self._completed_counter = itertools.count(1)
+        self.cache_policy = None
+        self.claim_batch_size = 50
+        self.flush_batch_size = 50
+        self.worker_cap = 50
+        self._scaled = True
+        self._executor = None
+        self._futures = []
+        self._initial_workers = 0
+        self._tls = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._print_queue = queue.SimpleQueue()
+        self._last_print_time = 0.0
+        # Bounded so a stalled writer applies backpressure to workers instead
+        # of buffering results without limit
+        self._result_queue = queue.Queue(maxsize=1000)
+        # Bounded so the producer claims only a little ahead of the workers
+        self._work_queue = queue.Queue(maxsize=self.claim_batch_size * 4)
+        self._producer_done = threading.Event()
+        atexit.register(self._close_connections)
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """
+        One long-lived connection per thread. Opening a sqlite connection is
+        not free (pager setup, pragmas, schema load), so helpers and workers
+        reuse this instead of connecting per call.
+        """
+        db = getattr(self._tls, 'db', None)
+
+        if db is None:
+            # cached_statements above the default 128 so every distinct hot
+            # SQL string stays prepared for the connection's lifetime.
+            # isolation_level=None puts the connection in autocommit: no
+            # Python-side statement sniffing, single statements (like the
+            # claim's UPDATE...RETURNING) are atomic on their own, and
+            # multi-statement transactions say BEGIN explicitly.
+            db = sqlite3.connect(
+                self.db_filename,
+                timeout=30.0,
+                check_same_thread=False,
+                cached_statements=256,
+                isolation_level=None
+            )
+            db.row_factory = sqlite3.Row
+            self.apply_pragmas(db)
+            self._tls.db = db
+
+            with self._connections_lock:
+                self._connections.append(db)
+
+        return db
+
+    def _get_cursor(self) -> sqlite3.Cursor:
+        """
+        One reusable cursor per thread for hot-path statements. Paired with
+        identical SQL strings, this keeps sqlite3's prepared-statement cache
+        warm instead of re-preparing per call.
+        """
+        cursor = getattr(self._tls, 'cursor', None)
 
-    def run(self, limit: int = None, random_order: bool = False, max_workers: int = 10):
+        if cursor is None:
+            cursor = self._get_conn().cursor()
+            self._tls.cursor = cursor
+
+        return cursor
+
+    def _close_connections(self):
+        with self._connections_lock:
+            for db in self._connections:
+                try:
+                    db.close()
+                except sqlite3.ProgrammingError:
+                    pass
+            self._connections.clear()
+
+    def run(self, limit: int = None, random_order: bool = False, max_workers: int = 10,
+            cache_policy: Optional[str] = None):
         print(f"Starting {self.__class__.__name__} with {max_workers} threads...")
+        self.cache_policy = cache_policy
+        if cache_policy:
+            print(f"Response cache policy: {cache_policy}.")
         self.start_time = time.time()
         self.iteration_count = 0
+        self._completed_counter = itertools.count(1)
 
         if limit:
             self.iteration_limit = int(limit)
@@ -38,49 +156,131 @@ class BaseBatchProcessor(ABC):
         else:
             print(f"Processing {self.entity_label.lower()}s by ID in descending order.")
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = []
-            for i in range(max_workers):
-                futures.append(
-                    executor.submit(self._worker_loop)
-                )
+        printer = threading.Thread(target=self._printer_loop, daemon=True)
+        printer.start()
+
+        writer = threading.Thread(target=self._result_writer, daemon=True)
+        writer.start()
 
-            # As futures finish, return their result, to re-raise and catch any exceptions
-            for future in concurrent.futures.as_completed(futures):
+        self._work_queue = queue.Queue(maxsize=self.claim_batch_size * 4)
+        self._producer_done = threading.Event()
+
+        producer = threading.Thread(target=self._producer_loop, daemon=True)
+        producer.start()
+
+        # The pool is sized to the scaling cap; ThreadPoolExecutor only spawns
+        # threads as work is submitted, so unused headroom costs nothing
+        pool_size = max(max_workers, self.worker_cap)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=pool_size) as executor:
+            self._executor = executor
+            self._initial_workers = max_workers
+            self._futures = [
+                executor.submit(self._worker_loop)
+                for _ in range(max_workers)
+            ]
+            self._scaled = False
+
+            # _scale_workers may add futures while we wait, so re-check until
+            # the list stops growing
+            while True:
+                done, not_done = concurrent.futures.wait(self._futures)
+                if not not_done and len(done) == len(self._futures):
+                    break
+
+            self._scaled = True
+
+            # Collect results, to re-raise and catch any worker exceptions
+            for future in self._futures:
                 try:
                     future.result()
                 except Exception as e:
                     print(f"Worker thread failed: {e}")
 
+        # Sentinels stop the writer and printer once everything queued so far
+        # is drained
+        self._result_queue.put(None)
+        writer.join()
+
+        self._print_queue.put(None)
+        printer.join()
+
         self._print_final_stats()
 
+    def _printer_loop(self):
+        """
+        Drain progress lines from a queue on a dedicated thread, so workers
+        never serialize behind terminal I/O on the hot path.
+        """
+        while True:
+            line = self._print_queue.get()
+            if line is None:
+                break
+            print(line)
+
+    def _producer_loop(self):
+        """
+        Single producer: claims batches from sqlite and feeds the in-memory
+        work queue, so workers never touch the database on the read path -
+        they block only on HTTP. One claimant also means zero write-lock
+        contention for claims.
+        """
+        db = self._get_conn()
+        claimed = 0
+
+        try:
+            while True:
+                batch_size = self.claim_batch_size
+
+                # Don't claim more rows than the iteration limit lets us process
+                if self.iteration_limit:
+                    batch_size = min(batch_size, self.iteration_limit - claimed)
+
+                if batch_size <= 0:
+                    break
+
+                ticket_rows = self._claim_batch(db, batch_size)
+                if not ticket_rows:
+                    break
+
+                claimed += len(ticket_rows)
+                self.iteration_count = claimed
+
+                for ticket_row in ticket_rows:
+                    self._work_queue.put(ticket_row)
+
+        finally:
+            self._producer_done.set()
+
     def _worker_loop(self):
-        with sqlite3.connect(self.db_filename, timeout=30.0) as db:
-            db.row_factory = sqlite3.Row
+        worker_successes = 0
+        worker_failures = 0
 
+        try:
             while True:
-                with self.count_lock:
-                    if self.iteration_limit and self.iteration_count >= self.iteration_limit:
+                try:
+                    ticket_row = self._work_queue.get(timeout=0.2)
+                except queue.Empty:
+                    if self._producer_done.is_set():
                         break
-                    self.iteration_count += 1
-
-                ticket_row = self._fetch_and_lock_next_item(db)
-                if not ticket_row:
-                    break
+                    continue
 
                 try:
+                    request_started = time.monotonic()
                     response = self._perform_api_action(ticket_row)
+                    observed_latency = time.monotonic() - request_started
 
                     status_code = response.status_code
 
-                    self._handle_success(db, ticket_row, response)
+                    self._result_queue.put(('success', self._success_params(ticket_row, response)))
+
+                    worker_successes += 1
 
-                    with self.count_lock:
-                        self.success_count += 1
+                    if not self._scaled:
+                        self._scale_workers(observed_latency)
 
                 except Exception as e:
-                    with self.count_lock:
-                        self.failure_count += 1
+                    worker_failures += 1
 
                     status_code = getattr(e.response, 'status_code', None) if hasattr(e, 'response') else None
 
@@ -88,20 +288,121 @@ class BaseBatchProcessor(ABC):
 
                     if hasattr(e, 'response') and e.response is not None:
                         status_code = e.response.status_code
-                        try:
-                            error_message = json.dumps(e.response.json())
-                        except:
-                            error_message = e.response.text
 
-                    self._handle_failure(db, ticket_row, status_code, error_message)
+                        if hasattr(e, 'body_cached'):
+                            # FreshserviceHTTPError already parsed the body
+                            error_message = e.body_cached
+                        else:
+                            try:
+                                error_message = orjson.dumps(orjson.loads(e.response.content)).decode()
+                            except:
+                                error_message = e.response.text
+
+                    self._result_queue.put(('failure', self._failure_params(ticket_row, status_code, error_message)))
+
+                # 4. Update Console (id is always the claim's first column)
+                self._print_progress(ticket_row[0], status_code)
+
+        finally:
+            # Fold this worker's tallies into the shared totals once, rather
+            # than taking count_lock per item
+            with self.count_lock:
+                self.success_count += worker_successes
+                self.failure_count += worker_failures
+
+    def _result_writer(self):
+        """
+        Single writer thread: drains result tuples from the queue and applies
+        them in batched transactions, so N workers' results cost one commit
+        (and WAL fsync) per flush instead of one each, and workers never
+        touch the database for writes after claiming.
+        """
+        db = self._get_conn()
+        pending_successes = []
+        pending_failures = []
+
+        while True:
+            try:
+                item = self._result_queue.get(timeout=0.2)
+            except queue.Empty:
+                # Quiet period: push out whatever accumulated
+                self._flush_results(db, pending_successes, pending_failures)
+                continue
+
+            if item is None:
+                self._flush_results(db, pending_successes, pending_failures)
+                return
+
+            kind, params = item
+            if kind == 'success':
+                pending_successes.append(params)
+            else:
+                pending_failures.append(params)
+
+            if len(pending_successes) + len(pending_failures) >= self.flush_batch_size:
+                self._flush_results(db, pending_successes, pending_failures)
+
+    def _scale_workers(self, observed_latency: float):
+        """
+        Resize the pool once, after the first successful response, to the
+        worker count that saturates the server's advertised rate limit:
+        the server allows total/60 requests per second and each request takes
+        ~observed_latency seconds, so total/60 * latency need to be in flight.
+        """
+        with self.count_lock:
+            if self._scaled:
+                return
+            self._scaled = True
+
+            total = self.fs_api.controller.server_ratelimit_total
+            desired = min(self.worker_cap, max(5, int(total / 60.0 * observed_latency)))
+
+            if desired <= self._initial_workers:
+                return
+
+            print(f"Rate limit supports ~{desired} concurrent workers; "
+                  f"starting {desired - self._initial_workers} more.")
+
+            for _ in range(self._initial_workers, desired):
+                self._futures.append(
+                    self._executor.submit(self._worker_loop)
+                )
+
+    def _flush_results(self, db: sqlite3.Connection, pending_successes: list, pending_failures: list):
+        """
+        Write buffered results in one transaction, so each HTTP response no
+        longer costs its own commit (and fsync).
+        """
+        if not pending_successes and not pending_failures:
+            return
+
+        cursor = self._get_cursor()
+        cursor.execute("BEGIN")
 
-                # 4. Update Console
-                self._print_progress(ticket_row['id'], status_code)
+        if pending_successes:
+            cursor.executemany(self.mark_success_sql, pending_successes)
+            pending_successes.clear()
+
+        if pending_failures:
+            cursor.executemany(self.mark_failure_sql, pending_failures)
+            pending_failures.clear()
+
+        db.commit()
 
     def _print_progress(self, row_id: int, status_code: Optional[int]):
         now = time.time()
         elapsed = now - self.start_time if self.start_time else 0
-        total_count = self.success_count + self.failure_count
+        # Every completion is counted, even when its line is debounced away
+        total_count = next(self._completed_counter)
+
+        # Debounce to ~10 lines/sec so a fast run doesn't spend its time
+        # formatting output; failures always print. The unlocked timestamp
+        # check can race, but the worst case is one extra line.
+        is_failure = status_code is None or status_code >= 400
+        if not is_failure and now - self._last_print_time < 0.1:
+            return
+        self._last_print_time = now
+
         requests_per_minute = (total_count / elapsed) * 60 if elapsed > 0 else 0
 
         # API Rate Limit Tracking
@@ -110,9 +411,8 @@ class BaseBatchProcessor(ABC):
         used = ratelimit_total - ratelimit_remaining
 
         pct = (used / ratelimit_total) * 100 if ratelimit_total > 0 else 0
-        bar_len = 15
-        filled = int(bar_len * pct / 100)
-        bar = '█' * filled + '-' * (bar_len - filled)
+        filled = int(self._BAR_LEN * pct / 100)
+        bar = self._BARS[filled]
 
         icon = "❌"
         if status_code and 200 <= status_code < 300:
@@ -120,11 +420,12 @@ class BaseBatchProcessor(ABC):
         elif status_code == 429:
             icon = "🚦"
 
-        with self.print_lock:
-            print(f"{self.entity_label} {row_id:06d} {icon} HTTP {status_code or '???'} "
-                  f"[{bar}] Rate limit: {ratelimit_total} req/min. "
-                  f"Current: {requests_per_minute:.1f} req/min. "
-                  f"Remaining: {ratelimit_remaining:03d}.")
+        self._print_queue.put(
+            f"{self.entity_label} {row_id:06d} {icon} HTTP {status_code or '???'} "
+            f"[{bar}] Rate limit: {ratelimit_total} req/min. "
+            f"Current: {requests_per_minute:.1f} req/min. "
+            f"Remaining: {ratelimit_remaining:03d}."
+        )
 
     def _print_final_stats(self):
         finish_time = time.time()
@@ -138,6 +439,8 @@ class BaseBatchProcessor(ABC):
         if duration > 0:
             print(f"Overall requests per minute: {(total / duration) * 60:.2f}.")
 
+        self.fs_api.close()
+
     @abstractmethod
     def create_tables(self):
         pass
@@ -147,7 +450,7 @@ class BaseBatchProcessor(ABC):
         pass
 
     @abstractmethod
-    def _fetch_and_lock_next_item(self, db_conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+    def _claim_batch(self, db_conn: sqlite3.Connection, batch_size: int) -> list:
         pass
 
     @abstractmethod
@@ -155,9 +458,9 @@ class BaseBatchProcessor(ABC):
         pass
 
     @abstractmethod
-    def _handle_success(self, db_conn: sqlite3.Connection, row: sqlite3.Row, response):
+    def _success_params(self, row: sqlite3.Row, response) -> tuple:
         pass
 
     @abstractmethod
-    def _handle_failure(self, db_conn: sqlite3.Connection, ticket_row: sqlite3.Row, status_code: int, error_message: str):
+    def _failure_params(self, ticket_row: sqlite3.Row, status_code: int, error_message: str) -> tuple:
         pass
\ No newline at end of file
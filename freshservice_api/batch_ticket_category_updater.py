@@ -1,14 +1,72 @@
-import datetime
+import time
+import random
 import sqlite3
 from typing import Optional
 
 from freshservice_api.base_batch_processor import BaseBatchProcessor
 
+# Hot-path SQL lives at module level so every call passes the identical string
+# and hits sqlite3's prepared-statement cache.
+_COUNT_ELIGIBLE_SQL = "SELECT count(*) FROM tickets WHERE update_state = 'ready';"
+
+_CLAIM_BATCH_SQL = """
+    UPDATE tickets
+    SET update_state      = 'in-progress',
+        request_timestamp = ?
+    WHERE id IN (
+        SELECT id
+        FROM tickets
+        WHERE update_state = 'ready'
+        ORDER BY id DESC
+        LIMIT ? OFFSET ?
+    )
+    RETURNING id, new_category, new_sub_category, new_item_category;
+"""
+
 class BatchTicketCategoryUpdater(BaseBatchProcessor):
     entity_label = "Ticket"
 
+    mark_success_sql = """
+        UPDATE tickets
+        SET update_state         = 'updated',
+            response_status_code = ?
+        WHERE id = ?;
+    """
+
+    mark_failure_sql = """
+        UPDATE tickets
+        SET update_state         = 'failed',
+            response_status_code = ?,
+            error_message        = ?
+        WHERE id = ?;
+    """
+
     def __init__(self, fs_api, db_filename):
         super().__init__(fs_api, db_filename=db_filename)
+        self._valid_categories = None
+        self._category_mappings = None
+
+    def _load_category_caches(self):
+        """
+        Read valid_categories and category_mappings into dicts once, so
+        validate_category/get_new_category are O(1) lookups instead of a SQL
+        point query per call.
+        """
+        db = self._get_conn()
+
+        self._valid_categories = {
+            (row['category'], row['sub_category'], row['item_category'])
+            for row in db.execute("SELECT category, sub_category, item_category FROM valid_categories")
+        }
+
+        self._category_mappings = {
+            (row['old_category'], row['old_sub_category'], row['old_item_category']): {
+                'new_category': row['new_category'],
+                'new_sub_category': row['new_sub_category'],
+                'new_item_category': row['new_item_category'],
+            }
+            for row in db.execute("SELECT * FROM category_mappings")
+        }
 
     def create_tables(self):
         create_tickets_table = """
@@ -21,7 +79,7 @@ class BatchTicketCategoryUpdater(BaseBatchProcessor):
             new_sub_category TEXT,
             new_item_category TEXT,
             update_state TEXT,
-            request_timestamp TIMESTAMP DEFAULT NULL,
+            request_timestamp INTEGER DEFAULT NULL, -- unix epoch milliseconds
             response_status_code INTEGER DEFAULT NULL,
             error_message TEXT DEFAULT NULL
         );
@@ -47,77 +105,83 @@ class BatchTicketCategoryUpdater(BaseBatchProcessor):
             new_item_category TEXT
         );
         """
+        # Indexes so the hot-path claim query and the category lookups in
+        # prepare are B-tree seeks instead of full-table scans. The claim and
+        # retry indexes are partial: they only hold rows in the state each
+        # query filters on, so they stay one or two pages as the table grows.
+        create_indexes = """
+        CREATE INDEX IF NOT EXISTS idx_tickets_ready
+            ON tickets(id DESC) WHERE update_state = 'ready';
+        CREATE INDEX IF NOT EXISTS idx_tickets_failed
+            ON tickets(id) WHERE update_state = 'failed';
+        CREATE INDEX IF NOT EXISTS idx_valid_categories
+            ON valid_categories(category, sub_category, item_category);
+        CREATE INDEX IF NOT EXISTS idx_category_mappings_old
+            ON category_mappings(old_category, old_sub_category, old_item_category);
+        """
+
         with sqlite3.connect(self.db_filename) as db:
+            # page_size is fixed once the file is initialized, so set it
+            # before apply_pragmas switches the journal mode
+            db.execute("PRAGMA page_size=8192")
+            self.apply_pragmas(db)
             db.execute(create_tickets_table)
             db.execute(create_valid_categories_table)
             db.execute(create_category_mappings_table)
+            db.executescript(create_indexes)
+            db.execute("ANALYZE")
 
             print("Created tables.")
 
     def prepare(self):
-        db = sqlite3.connect(database=self.db_filename, timeout=30.0)
-        db.row_factory = sqlite3.Row
+        db = self._get_conn()
 
-        query = """
-        SELECT * FROM tickets 
+        # Three set-based statements instead of per-ticket Python lookups, so
+        # SQLite walks the rows once. `IS` (not `=`) makes NULL sub/item
+        # categories compare the way the old per-row branches did.
+        skip_query = """
+        UPDATE tickets
+        SET update_state = 'skipped'
         WHERE update_state IS NULL
-        ORDER BY id DESC 
+          AND (
+            (category IS NULL AND sub_category IS NULL AND item_category IS NULL)
+            OR EXISTS (
+                SELECT 1
+                FROM valid_categories v
+                WHERE v.category IS tickets.category
+                  AND v.sub_category IS tickets.sub_category
+                  AND v.item_category IS tickets.item_category
+            )
+          );
+        """
+
+        map_query = """
+        UPDATE tickets
+        SET update_state      = 'ready',
+            new_category      = m.new_category,
+            new_sub_category  = m.new_sub_category,
+            new_item_category = m.new_item_category
+        FROM category_mappings m
+        WHERE tickets.update_state IS NULL
+          AND m.old_category IS tickets.category
+          AND m.old_sub_category IS tickets.sub_category
+          AND m.old_item_category IS tickets.item_category;
         """
 
-        tickets = db.execute(query).fetchall()
-
-        skipped = 0
-        unmapped = 0
-        ready = 0
-        total = 0
-
-        for ticket in tickets:
-
-            category_valid = self.validate_category(ticket["category"], ticket["sub_category"], ticket["item_category"])
-            category_empty = all(v is None for v in [ticket["category"], ticket["sub_category"], ticket["item_category"]])
-
-            if category_valid or category_empty:
-                query = """
-                        UPDATE tickets
-                        SET update_state = 'skipped'
-                        WHERE id = ?
-                        """
-                db.execute(query, (ticket["id"],))
-                skipped = skipped + 1
-            else:
-                new = self.get_new_category(ticket["category"], ticket["sub_category"], ticket["item_category"])
-                if new:
-                    query = """
-                            UPDATE tickets
-                            SET update_state = 'ready',
-                                new_category = ?,
-                                new_sub_category = ?,
-                                new_item_category = ?
-                            WHERE id = ?;
-                            """
-                    db.execute(
-                        query,
-                        (
-                            new["new_category"],
-                            new["new_sub_category"],
-                            new["new_item_category"],
-                            ticket["id"]
-                        )
-                    )
-                    ready = ready + 1
-                else:
-                    query = """
-                            UPDATE tickets
-                            SET update_state = 'unmapped'
-                            WHERE id = ?;
-                            """
-                    db.execute(query, (ticket["id"],))
-                    unmapped = unmapped + 1
-
-            total = total + 1
+        unmapped_query = """
+        UPDATE tickets
+        SET update_state = 'unmapped'
+        WHERE update_state IS NULL;
+        """
 
+        db.execute("BEGIN")
+        skipped = db.execute(skip_query).rowcount
+        ready = db.execute(map_query).rowcount
+        unmapped = db.execute(unmapped_query).rowcount
         db.commit()
 
+        total = skipped + ready + unmapped
+
         print(f"Prepared {total} tickets:")
         print(f"{skipped} skipped - already have valid categories.")
         print(f"{unmapped} unmapped - no new category found for ticket's existing category.")
@@ -129,90 +193,29 @@ class BatchTicketCategoryUpdater(BaseBatchProcessor):
             sub_category: Optional[str]=None,
             item_category: Optional[str]=None
     ) -> bool:
-        db = sqlite3.connect(database=self.db_filename, timeout=30.0)
-        db.row_factory = sqlite3.Row
-
-        if category and sub_category and item_category:
-            query = """
-            SELECT * FROM valid_categories 
-            WHERE category = ?
-            AND sub_category = ?
-            AND item_category = ?
-            LIMIT 1;
-            """
-            cursor = db.execute(query, (category, sub_category, item_category))
-        elif category and sub_category:
-            query = """
-            SELECT * FROM valid_categories 
-            WHERE category = ?
-            AND sub_category = ?
-            AND item_category IS NULL
-            LIMIT 1;
-            """
-            cursor = db.execute(query, (category, sub_category))
-        elif category:
-            query = """
-            SELECT * FROM valid_categories 
-            WHERE category = ?
-            AND sub_category IS NULL
-            AND item_category IS NULL
-            LIMIT 1;
-            """
-            cursor = db.execute(query, (category,))
-        else:
+        if not category:
             return False
 
-        result = cursor.fetchone()
+        if self._valid_categories is None:
+            self._load_category_caches()
 
-        if result is not None:
-            return True
-        return False
+        return (category, sub_category or None, item_category or None) in self._valid_categories
 
     def get_new_category(
             self,
              old_category: str,
              old_sub_category: Optional[str] = None,
              old_item_category: Optional[str] = None
-    ) -> Optional[sqlite3.Row]:
-        db = sqlite3.connect(database=self.db_filename, timeout=30.0)
-        db.row_factory = sqlite3.Row
-
-        if old_sub_category and old_item_category:
-            query = """
-                    SELECT *
-                    FROM category_mappings
-                    WHERE old_category = ?
-                      AND old_sub_category = ?
-                      AND old_item_category = ?
-                    LIMIT 1;
-                    """
-            cursor = db.execute(query, (old_category, old_sub_category, old_item_category))
-        elif old_sub_category:
-            query = """
-                    SELECT *
-                    FROM category_mappings
-                    WHERE old_category = ?
-                      AND old_sub_category = ?
-                      AND old_item_category IS NULL
-                    LIMIT 1;
-                    """
-            cursor = db.execute(query, (old_category, old_sub_category))
-        else:
-            query = """
-                    SELECT *
-                    FROM category_mappings
-                    WHERE old_category = ?
-                      AND old_sub_category IS NULL
-                      AND old_item_category IS NULL
-                    LIMIT 1;
-                    """
-            cursor = db.execute(query, (old_category,))
-
-        return cursor.fetchone()
+    ) -> Optional[dict]:
+        if self._category_mappings is None:
+            self._load_category_caches()
+
+        return self._category_mappings.get(
+            (old_category, old_sub_category or None, old_item_category or None)
+        )
 
     def retry_failed(self):
-        db = sqlite3.connect(database=self.db_filename, timeout=30.0)
-        db.row_factory = sqlite3.Row
+        db = self._get_conn()
 
         query = """
         UPDATE tickets
@@ -234,76 +237,56 @@ class BatchTicketCategoryUpdater(BaseBatchProcessor):
         else:
             print(f"No tickets to retry.")
 
-    def _fetch_and_lock_next_item(self, db):
-        try:
-            # Lock DB for this thread
-            if self.random_order:
-                next_ticket_query = """
-                    SELECT *
-                    FROM tickets
-                    WHERE update_state = 'ready'
-                    ORDER BY RANDOM()
-                    LIMIT 1;
-                """
-            else:
-                next_ticket_query = """
-                    SELECT *
-                    FROM tickets
-                    WHERE update_state = 'ready'
-                    ORDER BY id DESC
-                    LIMIT 1;
-                """
-            db.execute("BEGIN IMMEDIATE")
-            cursor = db.execute(next_ticket_query)
-
-            ticket_row = cursor.fetchone()
-
-            if not ticket_row:
+    def _claim_batch(self, db, batch_size):
+        # Transient lock contention must not kill the worker - an empty batch
+        # means "queue drained" to the worker loop - so back off with jitter
+        # and retry before giving up.
+        for _ in range(5):
+            try:
+                # For random order, claim a contiguous slice starting at a random
+                # offset and shuffle it in Python - ORDER BY RANDOM() would scan
+                # and sort every eligible row on every claim. Clamping the offset
+                # guarantees a full batch while eligible rows remain.
+                cursor = self._get_cursor()
+
+                offset = 0
+                if self.random_order:
+                    eligible = cursor.execute(_COUNT_ELIGIBLE_SQL).fetchone()[0]
+                    offset = random.randrange(max(1, eligible - batch_size + 1))
+
+                cursor.execute(
+                    _CLAIM_BATCH_SQL,
+                    (int(time.time() * 1000), batch_size, offset)
+                )
+                ticket_rows = cursor.fetchall()
+                db.commit()
+
+                if self.random_order:
+                    random.shuffle(ticket_rows)
+
+                return ticket_rows
+
+            except sqlite3.OperationalError:
                 db.rollback()
-                return None
+                time.sleep(random.uniform(0.01, 0.1))
 
-            in_progress_query = """
-                UPDATE tickets
-                SET update_state      = 'in-progress',
-                    request_timestamp = ?
-                WHERE id = ?;
-            """
+        return []
 
-            db.execute(in_progress_query, (datetime.datetime.now(), ticket_row['id']))
-            db.commit()
-            return ticket_row
+    def _perform_api_action(self, ticket_row):
+        # Unpack positionally (claim column order) instead of paying Row's
+        # column-name search per field
+        ticket_id, new_category, new_sub_category, new_item_category = ticket_row
 
-        except sqlite3.OperationalError:
-            db.rollback()
-            return None
+        ticket_update_payload = {"category": new_category}
+        if new_sub_category:
+            ticket_update_payload["sub_category"] = new_sub_category
+        if new_item_category:
+            ticket_update_payload["item_category"] = new_item_category
 
-    def _perform_api_action(self, ticket_row):
-        ticket_update_payload = {"category": ticket_row['new_category']}
-        if ticket_row['new_sub_category']:
-            ticket_update_payload["sub_category"] = ticket_row['new_sub_category']
-        if ticket_row['new_item_category']:
-            ticket_update_payload["item_category"] = ticket_row['new_item_category']
-
-        return self.fs_api.ticket().update(ticket_row['id'], ticket_update_payload)
-
-    def _handle_success(self, db, ticket_row, response):
-        update_sql = """
-            UPDATE tickets
-            SET update_state         = 'updated',
-                response_status_code = ?
-            WHERE id = ?;
-        """
+        return self.fs_api.ticket().update(ticket_id, ticket_update_payload)
 
-        db.execute(update_sql, (response.status_code, ticket_row['id']))
-        db.commit()
+    def _success_params(self, ticket_row, response):
+        return response.status_code, ticket_row[0]
 
-    def _handle_failure(self, db, ticket_row, status_code, error_message):
-        update_sql = """
-             UPDATE tickets
-             SET update_state         = 'failed',
-                 response_status_code = ?,
-                 error_message        = ?
-             WHERE id = ?; \
-         """
-        db.execute(update_sql, (status_code, error_message, ticket_row['id']))
-        db.commit()
+    def _failure_params(self, ticket_row, status_code, error_message):
+        return status_code, error_message, ticket_row[0]
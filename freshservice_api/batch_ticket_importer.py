@@ -1,11 +1,55 @@
-import datetime
+import hashlib
+import time
+import random
 import sqlite3
 
+import orjson
+
 from freshservice_api.base_batch_processor import BaseBatchProcessor
+from freshservice_api.exceptions import FreshserviceError
+
+# Hot-path SQL lives at module level so every call passes the identical string
+# and hits sqlite3's prepared-statement cache.
+_COUNT_ELIGIBLE_SQL = "SELECT count(*) FROM tickets WHERE request_timestamp IS NULL;"
+
+_CLAIM_BATCH_SQL = """
+    UPDATE tickets
+    SET request_timestamp = ?
+    WHERE id IN (
+        SELECT id
+        FROM tickets
+        WHERE request_timestamp IS NULL
+        ORDER BY id DESC
+        LIMIT ? OFFSET ?
+    )
+    RETURNING id, email, subject, description, category, sub_category, item_category;
+"""
+
+class _CachedResponse:
+    """Stand-in for an httpx.Response served from the response cache."""
+    __slots__ = ('status_code', 'content')
+
+    def __init__(self, status_code: int, content: bytes):
+        self.status_code = status_code
+        self.content = content
 
 class BatchTicketImporter(BaseBatchProcessor):
     entity_label = "Ticket"
 
+    mark_success_sql = """
+        UPDATE tickets
+        SET response_ticket_id   = ?,
+            response_status_code = ?
+        WHERE id = ?;
+    """
+
+    mark_failure_sql = """
+        UPDATE tickets
+        SET response_status_code = ?,
+            error_message        = ?
+        WHERE id = ?;
+    """
+
     def __init__(self, fs_api, db_filename):
         super().__init__(fs_api, db_filename=db_filename)
 
@@ -20,17 +64,43 @@ class BatchTicketImporter(BaseBatchProcessor):
                  category             TEXT,
                  sub_category         TEXT,
                  item_category        TEXT,
-                 request_timestamp    TIMESTAMP DEFAULT NULL,
+                 request_timestamp    INTEGER   DEFAULT NULL, -- unix epoch milliseconds
                  response_ticket_id   INTEGER,
                  response_status_code INTEGER   DEFAULT NULL,
                  error_message        TEXT      DEFAULT NULL
              );
         """
+        # Partial index holding only unclaimed rows: the claim subquery's
+        # probe stays a one-page read, and sqlite drops entries as rows are
+        # claimed, so it shrinks as the run progresses.
+        create_index_sql = """
+            CREATE INDEX IF NOT EXISTS idx_tickets_unclaimed
+                ON tickets(id DESC) WHERE request_timestamp IS NULL;
+        """
+        # Deterministic response cache keyed by a SHA256 of the canonical
+        # payload; lets retry/replay runs answer repeat payloads without
+        # spending API calls.
+        create_cache_sql = """
+            CREATE TABLE IF NOT EXISTS response_cache
+            (
+                key           BLOB PRIMARY KEY,
+                status_code   INTEGER NOT NULL,
+                response_json TEXT    NOT NULL
+            );
+        """
+
         with sqlite3.connect(self.db_filename) as db:
+            # page_size is fixed once the file is initialized, so set it
+            # before apply_pragmas switches the journal mode
+            db.execute("PRAGMA page_size=8192")
+            self.apply_pragmas(db)
             db.execute(create_sql)
+            db.execute(create_index_sql)
+            db.execute(create_cache_sql)
+            db.execute("ANALYZE")
         print("Created tickets table.")
 
-    def retry_failed(self):
+    def retry_failed(self, cache_policy=None):
         update_sql = """
             UPDATE tickets
             SET request_timestamp    = NULL,
@@ -39,94 +109,112 @@ class BatchTicketImporter(BaseBatchProcessor):
             WHERE response_status_code IS NOT 201
               AND response_status_code IS NOT NULL;
             """
-        with sqlite3.connect(self.db_filename) as db:
-            result = db.execute(update_sql)
-            db.commit()
-            count = result.rowcount
+        db = self._get_conn()
+        result = db.execute(update_sql)
+        db.commit()
+        count = result.rowcount
 
         if count > 0:
             print(f"Retrying import of {count} tickets...")
-            self.run()
+            self.run(cache_policy=cache_policy)
         else:
             print("No tickets to retry.")
 
-    def _fetch_and_lock_next_item(self, db):
-        try:
-            # Lock DB for this thread
-            if self.random_order:
-                next_ticket_query = """
-                    SELECT *
-                    FROM tickets
-                    WHERE request_timestamp IS NULL
-                    ORDER BY RANDOM()
-                    LIMIT 1;
-                """
-            else:
-                next_ticket_query = """
-                    SELECT *
-                    FROM tickets
-                    WHERE request_timestamp IS NULL
-                    ORDER BY id DESC
-                    LIMIT 1;
-                """
-            db.execute("BEGIN IMMEDIATE")
-            cursor = db.execute(next_ticket_query)
-
-            ticket_row = cursor.fetchone()
-
-            if not ticket_row:
+    def _claim_batch(self, db, batch_size):
+        # Transient lock contention must not kill the worker - an empty batch
+        # means "queue drained" to the worker loop - so back off with jitter
+        # and retry before giving up.
+        for _ in range(5):
+            try:
+                # For random order, claim a contiguous slice starting at a random
+                # offset and shuffle it in Python - ORDER BY RANDOM() would scan
+                # and sort every eligible row on every claim. Clamping the offset
+                # guarantees a full batch while eligible rows remain.
+                cursor = self._get_cursor()
+
+                offset = 0
+                if self.random_order:
+                    eligible = cursor.execute(_COUNT_ELIGIBLE_SQL).fetchone()[0]
+                    offset = random.randrange(max(1, eligible - batch_size + 1))
+
+                cursor.execute(
+                    _CLAIM_BATCH_SQL,
+                    (int(time.time() * 1000), batch_size, offset)
+                )
+                ticket_rows = cursor.fetchall()
+                db.commit()
+
+                if self.random_order:
+                    random.shuffle(ticket_rows)
+
+                return ticket_rows
+
+            except sqlite3.OperationalError:
                 db.rollback()
-                return None
-
-            in_progress_query = """
-                UPDATE tickets
-                SET request_timestamp = ?
-                WHERE id = ?;
-            """
-
-            db.execute(in_progress_query, (datetime.datetime.now(), ticket_row['id']))
-            db.commit()
-            return ticket_row
+                time.sleep(random.uniform(0.01, 0.1))
 
-        except sqlite3.OperationalError:
-            db.rollback()
-            return None
+        return []
 
     def _perform_api_action(self, ticket_row):
+        # Unpack positionally (claim column order) instead of paying Row's
+        # column-name search per field
+        _, email, subject, description, category, sub_category, item_category = ticket_row
+
         payload = {
-            "email": ticket_row["email"],
-            "subject": ticket_row["subject"],
-            "description": ticket_row["description"],
+            "email": email,
+            "subject": subject,
+            "description": description,
             "source": 1002, # API
-            "category": ticket_row['category']
+            "category": category
         }
-        if ticket_row['sub_category']:
-            payload["sub_category"] = ticket_row['sub_category']
-        if ticket_row['item_category']:
-            payload["item_category"] = ticket_row['item_category']
+        if sub_category:
+            payload["sub_category"] = sub_category
+        if item_category:
+            payload["item_category"] = item_category
 
-        return self.fs_api.ticket().create(payload)
+        if not self.cache_policy:
+            return self.fs_api.ticket().create(payload)
 
-    def _handle_success(self, db, ticket_row, response):
-        response_json = response.json()
-        response_ticket_id = response_json.get('ticket', {}).get('id')
+        return self._create_with_cache(payload)
 
-        update_sql = """
-            UPDATE tickets
-            SET response_ticket_id   = ?,
-                response_status_code = ?
-            WHERE id = ?;
+    def _create_with_cache(self, payload):
+        """
+        Policies: 'enabled' answers repeat payloads from the cache and stores
+        new responses; 'replay' errors on a miss (iterate on downstream logic
+        with zero API cost); 'write-only' always calls the API but warms the
+        cache.
         """
+        db = self._get_conn()
+        key = hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).digest()
 
-        db.execute(update_sql, (response_ticket_id, response.status_code, ticket_row['id']))
-        db.commit()
+        if self.cache_policy in ('enabled', 'replay'):
+            cached = db.execute(
+                "SELECT status_code, response_json FROM response_cache WHERE key = ?;",
+                (key,)
+            ).fetchone()
 
-    def _handle_failure(self, db, ticket_row, status_code, error_message):
-        update_sql = """
-            UPDATE tickets
-            SET response_status_code = ?,
-                error_message        = ?
-            WHERE id = ?;
-        """
-        db.execute(update_sql, (status_code, error_message, ticket_row['id']))
-        db.commit()
+            if cached is not None:
+                return _CachedResponse(cached[0], cached[1].encode())
+
+            if self.cache_policy == 'replay':
+                raise FreshserviceError(f"Response cache miss in replay mode for {payload.get('email')!r}.")
+
+        response = self.fs_api.ticket().create(payload)
+
+        if 200 <= response.status_code < 300:
+            db.execute(
+                "INSERT OR REPLACE INTO response_cache (key, status_code, response_json) VALUES (?, ?, ?);",
+                (key, response.status_code, response.content.decode())
+            )
+            db.commit()
+
+        return response
+
+    def _success_params(self, ticket_row, response):
+        response_json = orjson.loads(response.content)
+        response_ticket_id = response_json.get('ticket', {}).get('id')
+
+        return response_ticket_id, response.status_code, ticket_row[0]
+
+    def _failure_params(self, ticket_row, status_code, error_message):
+        return status_code, error_message, ticket_row[0]
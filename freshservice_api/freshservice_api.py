@@ -1,4 +1,9 @@
+import base64
+import concurrent.futures
 import httpx
+import orjson
+import random
+import threading
 import time
 from .ticket import Ticket
 from .rate_limit_controller import RateLimitController
@@ -9,31 +14,131 @@ class FreshserviceApi:
     Freshservice API Client.
     """
 
-    def __init__(self, api_key: str, domain: str, headroom: int = 10):
+    # Matches BaseBatchProcessor.worker_cap, so even a fully scaled-up worker
+    # pool never queues on an exhausted connection pool.
+    DEFAULT_MAX_CONNECTIONS = 50
+
+    def __init__(self, api_key: str, domain: str, headroom: int = 10, max_connections: int = DEFAULT_MAX_CONNECTIONS):
         self.api_key = api_key
         self.api_version = "v2"
         self.base_url = f"https://{domain}/api/{self.api_version}"
+        self._base = self.base_url.rstrip('/') + '/'
+
+        # Prebuilt Basic auth header as a default client header, so httpx
+        # skips its per-request auth flow machinery entirely.
+        auth_header = "Basic " + base64.b64encode(f"{api_key}:X".encode()).decode()
 
+        # One shared client for all worker threads (httpx.Client is
+        # thread-safe); HTTP/2 multiplexes their requests over few sockets.
         self.client = httpx.Client(
-            auth=(api_key, "X"),
             http2=True,
-            headers={"Content-Type": "application/json"},
-            timeout=60.0
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": auth_header
+            },
+            timeout=60.0,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections // 2
+            )
         )
 
         self.controller = RateLimitController(headroom=headroom)
 
+        self._retry_lock = threading.Lock()
+        self._retry_event = threading.Event()
+        self._retry_event.set()
+        self._retry_until = 0.0
+
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def _pause_for_retry(self, retry_seconds: float):
+        """
+        Shared deadline wait for 429 responses. The first thread to see the
+        429 sets the deadline and clears the event; every other thread waits
+        on the same event instead of sleeping independently, and each wakes
+        with a little jitter so they don't all re-issue at the same instant.
+        """
+        deadline = time.time() + retry_seconds
+
+        with self._retry_lock:
+            if deadline > self._retry_until:
+                self._retry_until = deadline
+                self._retry_event.clear()
+
+                timer = threading.Timer(retry_seconds, self._retry_event.set)
+                timer.daemon = True
+                timer.start()
+
+        remaining = self._retry_until - time.time()
+        if remaining > 0:
+            self._retry_event.wait(timeout=remaining)
+
+        # Jitter proportional to the pause, so the threads released at the
+        # deadline don't all thunder back within the same instant
+        time.sleep(random.uniform(0, max(0.5, 0.25 * retry_seconds)))
+
     def request(self, method: str, path: str, max_retries: int = 5, **kwargs) -> httpx.Response:
-        url = f"{self.base_url}/{path.lstrip('/')}"
+        url = self._base + (path[1:] if path.startswith('/') else path)
+
+        # Serialize bodies with orjson instead of httpx's stdlib json path;
+        # the client's default Content-Type header already marks it as JSON.
+        if "json" in kwargs:
+            kwargs["content"] = orjson.dumps(kwargs.pop("json"))
+
+        if method != "GET":
+            return self._send(method, url, max_retries, **kwargs)
+
+        # Single-flight for idempotent reads: if an identical GET is already
+        # in flight, later callers wait on its Future instead of spending
+        # another rate-limit token and round trip on the same answer.
+        key = (url, frozenset((kwargs.get("params") or {}).items()))
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = concurrent.futures.Future()
+                self._inflight[key] = future
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            response = self._send(method, url, max_retries, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(response)
+            return response
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    def _send(self, method: str, url: str, max_retries: int, **kwargs) -> httpx.Response:
         attempts = 0
 
+        # Bound method hoisted out of the retry loop to skip the attribute
+        # lookups per attempt
+        send = self.client.request
+
         while attempts <= max_retries:
 
             self.controller.block_until_ready()
 
             try:
-                response = self.client.request(method, url, **kwargs)
-                self.controller.update_and_notify(response.headers)
+                response = send(method, url, **kwargs)
+
+                # Parse the three interesting headers exactly once per
+                # response; the 429 path below reuses the same values.
+                headers = response.headers
+                rl_remaining = headers.get("x-ratelimit-remaining")
+                rl_total = headers.get("x-ratelimit-total")
+                retry_after = headers.get("Retry-After")
+
+                self.controller.update_and_notify_values(rl_remaining, rl_total, retry_after)
 
                 if response.status_code == 429:
                     attempts += 1
@@ -41,11 +146,31 @@ class FreshserviceApi:
                         print(f"❌ Max retries ({max_retries}) hit for 429.")
                         break
 
-                    retry_after = int(response.headers.get("Retry-After", 5))
-                    time.sleep(retry_after)
+                    # Honor Retry-After when given; otherwise back off
+                    # exponentially so repeated 429s spread the herd out
+                    if retry_after is not None:
+                        retry_seconds = int(retry_after)
+                    else:
+                        retry_seconds = min(60, 2 ** attempts)
+
+                    self._pause_for_retry(retry_seconds)
                     continue
 
-                response.raise_for_status()
+                if response.status_code >= 400:
+                    # Parse the error body exactly once and cache it on the
+                    # exception, so failure handling doesn't re-parse the JSON
+                    try:
+                        body = orjson.dumps(orjson.loads(response.content)).decode()
+                    except Exception:
+                        body = response.text
+
+                    error = FreshserviceHTTPError(
+                        f"HTTP {response.status_code} for {method} {url}",
+                        response=response
+                    )
+                    error.body_cached = body
+                    raise error
+
                 return response
 
             except httpx.RequestError as e:
@@ -1,166 +1,150 @@
+import collections
 import threading
 import time
 from typing import Mapping, Any
 
 class RateLimitController:
+    """
+    Token-bucket pacing for the shared API quota.
+
+    Tokens refill continuously at {server_ratelimit_total}/60 per second up to
+    a capacity of {server_ratelimit_total}; each request consumes one token.
+    Admission is O(1) arithmetic on a single monotonic clock read, and the
+    server's x-ratelimit-* headers only *correct drift* by clamping the bucket,
+    so the steady state never waits on a response round-trip to admit the next
+    request.
+    """
+
     def __init__(self, headroom: int = 10):
+        # Plain Lock plus one Event per sleeping thread instead of a
+        # threading.Condition: Condition is pure Python and walks its waiter
+        # list on every wait/notify, while Lock and Event are C-implemented.
         self._lock = threading.Lock()
-        self._condition = threading.Condition(self._lock)
+        self._waiters = collections.deque()
 
         self.headroom = headroom
 
         self.server_ratelimit_remaining = 160
         self.server_ratelimit_total = 160
 
-        self.requests_in_flight = 0
-        self.last_request_timestamp = 0.0
-        self.retry_after_timestamp = 0.0
+        self.rate = self.server_ratelimit_total / 60.0
+        self.capacity = float(self.server_ratelimit_total)
+        self.tokens = float(max(0, self.server_ratelimit_remaining - headroom))
+
+        # During a Retry-After pause this sits in the future, so refill
+        # arithmetic naturally yields zero tokens until the pause expires.
+        self.last_refill = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.last_refill
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.last_refill = now
 
-        self.probe_wait_seconds = 1.0
-        self.probe_scheduled = False
+    def _take_token_locked(self, now: float) -> bool:
+        """Refill, then take a token if one is available. Caller holds _lock."""
+        self._refill(now)
+
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+
+        return False
+
+    def try_acquire(self) -> bool:
+        """
+        Take a token if one is available, without blocking. This is the hot
+        path - block_until_ready tries it first, so in the steady state
+        admission is one raw C lock acquire plus arithmetic, no waiter-list
+        bookkeeping.
+        """
+        with self._lock:
+            return self._take_token_locked(time.monotonic())
 
     def block_until_ready(self):
         """
-        Temporarily blocks the calling thread for a safe interval, then registers it as 'in-flight'.
+        Block the calling thread until the bucket holds a token, then take it.
         """
-        with self._condition:
-            while True:
-                now = time.time()
-
-                if now < self.retry_after_timestamp:
-                    self._condition.wait(timeout=self.retry_after_timestamp - now)
-                    continue
-
-                base_interval_seconds = 60.0 / self.server_ratelimit_total
-
-                ratelimit_remaining = self.server_ratelimit_remaining - self.requests_in_flight
-
-                if ratelimit_remaining > self.headroom:
-
-                    self.probe_wait_seconds = max(1.0, base_interval_seconds)
-
-                    braking_threshold = self.headroom * 3
-
-                    if ratelimit_remaining > braking_threshold:
-                        interval_multiplier = 1.0
-                    else:
-                        interval_multiplier = braking_threshold / max(1, ratelimit_remaining)
-
-                    required_interval_seconds = base_interval_seconds * interval_multiplier
-                    seconds_since_last_request = now - self.last_request_timestamp
-
-                    if seconds_since_last_request < required_interval_seconds:
-                        seconds_to_wait = required_interval_seconds - seconds_since_last_request
-                        self._condition.wait(timeout=seconds_to_wait)
-                        continue
-                    else:
-                        self.requests_in_flight += 1
-                        self.last_request_timestamp = now
-
-                        # Allow the caller to place a request
-                        return
-
-                else:
-                    """
-                    The number of requests remaining before we hit the ratelimit is less than the headroom.
-                    
-                    To reduce the chance that we (or any other API consumers) hit the rate limit:
-                                        
-                    Make this thread (and request) wait if there are already other requests in flight, or if another
-                    thread has scheduled a "probe".
-                      
-                    Otherwise, designate this thread as a "probe" which:
-                     1. Waits for {probe_wait_seconds}
-                     2. Re-checks if we are still using our headroom 
-                     3. Allows the caller to make a request (which updates {server_ratelimit_remaining})
-                     4. Increases {probe_wait_seconds}, so if another thread finds we are still using our headroom, the 
-                        next probe waits longer
-                    """
-
-                    if self.requests_in_flight > 0 or self.probe_scheduled:
-                        print(f"Remaining quota ({ratelimit_remaining}) below headroom ({self.headroom}). "
-                              f"Sleeping until woken.")
-                        self._condition.wait()
-                        continue
-
-                    else:
-                        # Make other threads aware that this thread will be the "probe" and allow one request to execute
-                        self.probe_scheduled = True
-                        print(f"Remaining quota ({ratelimit_remaining}) below headroom ({self.headroom}). "
-                              f"Sleeping for {self.probe_wait_seconds}s...")
-
-                        try:
-                            self._condition.wait(timeout=self.probe_wait_seconds)
-                        finally:
-                            self.probe_scheduled = False
-
-                        # After waiting, check if we still don't have enough remaining ratelimit
-                        if (self.server_ratelimit_remaining - self.requests_in_flight) <= self.headroom:
-                            # Increase backoff for the next probe, up to a maximum of 60 seconds
-                            self.probe_wait_seconds = min(self.probe_wait_seconds * 2, 60.0)
-
-                            self.requests_in_flight += 1
-                            self.last_request_timestamp = time.time()
-
-                            # Allow the caller to place a request
-                            return
-
-                        continue
+        if self.try_acquire():
+            return
+
+        while True:
+            waiter = None
+
+            with self._lock:
+                now = time.monotonic()
+
+                if self._take_token_locked(now):
+                    return
+
+                # Time until the pause (if any) ends plus until one token exists
+                seconds_to_wait = max(0.0, self.last_refill - now) + (1.0 - self.tokens) / self.rate
+                waiter = threading.Event()
+                self._waiters.append(waiter)
+
+            # Sleep outside the lock; an early notify wakes us, otherwise the
+            # timeout fires just as the next token refills
+            waiter.wait(timeout=seconds_to_wait)
+
+    def _wake_waiters(self):
+        """
+        Wake every sleeping thread. Called outside self._lock - deque.popleft
+        and Event.set are both atomic, and a set() on an Event whose waiter
+        already timed out is harmless.
+        """
+        while True:
+            try:
+                self._waiters.popleft().set()
+            except IndexError:
+                return
 
     def update_and_notify(self, headers: Mapping[str, Any] = None):
         """
-        - Decrement the in-flight requests counter
-        - If 'Retry-After' header is present: trigger global pause
-        - If 'x-ratelimit-*' headers are present: Updates quota and optimizes pacing.
+        Convenience wrapper: pull the three interesting headers out of a
+        (case-insensitive) header mapping and delegate. Hot callers that have
+        already parsed them use update_and_notify_values directly.
         """
         if headers is None:
             headers = {}
 
-        with self._condition:
-
-            # We have received a response, so decrement how many are in flight
-            self.requests_in_flight -= 1
+        self.update_and_notify_values(
+            headers.get("x-ratelimit-remaining"),
+            headers.get("x-ratelimit-total"),
+            headers.get("Retry-After")
+        )
 
-            if self.requests_in_flight < 0: self.requests_in_flight = 0 # Prevent going below zero
-
-            retry_after = headers.get("Retry-After")
+    def update_and_notify_values(self, remaining, total, retry_after):
+        """
+        - If a Retry-After value is present: drain the bucket and pause refill
+        - If x-ratelimit-* values are present: update the refill rate and
+          clamp the bucket so we never outrun the server's actual quota.
+        """
+        with self._lock:
 
             if retry_after is not None:
                 try:
                     retry_seconds = int(retry_after)
-                    self.retry_after_timestamp = time.time() + retry_seconds
+                    self.tokens = 0.0
+                    self.last_refill = time.monotonic() + retry_seconds
                     self.server_ratelimit_remaining = 0
 
                     print(f"Server responded with 'Retry-After' header. "
                           f"Informing all threads to pause for {retry_seconds}s.")
-                    self._condition.notify_all()
-                    return
                 except ValueError:
                     pass # If header is malformed, proceed to standard logic
 
-            remaining = headers.get("x-ratelimit-remaining")
-            total = headers.get("x-ratelimit-total")
-            prev_remaining = self.server_ratelimit_remaining
-
             if remaining is not None:
                 self.server_ratelimit_remaining = int(remaining)
             if total is not None:
                 self.server_ratelimit_total = int(total)
+                self.rate = self.server_ratelimit_total / 60.0
+                self.capacity = float(self.server_ratelimit_total)
 
-            # Calculate effective remaining after accounting for threads awaiting a response from the server
-            effective_remaining = self.server_ratelimit_remaining - self.requests_in_flight
-
-            if self.server_ratelimit_remaining > prev_remaining:
-                print(f"Quota increased from ({prev_remaining} to {self.server_ratelimit_remaining}). "
-                      f"Waking all threads to make their (paced) request.")
-                self._condition.notify_all()
-
-            elif effective_remaining > self.headroom:
-                self._condition.notify_all()
-
-            else:
-
-                print(f"Only {effective_remaining} requests until we hit the rate limit."
-                      f"Waking a single thread to make a (paced) request and check if the quota has been refreshed.")
-                self._condition.notify()
+            if remaining is not None:
+                # Correct drift: the bucket may never promise more requests
+                # than the server says are left, minus our safety headroom.
+                self.tokens = min(self.tokens, float(max(0, self.server_ratelimit_remaining - self.headroom)))
 
+        # Woken threads re-run the admission arithmetic themselves, so waking
+        # outside the lock is safe and keeps the critical section short
+        self._wake_waiters()
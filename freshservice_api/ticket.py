@@ -33,6 +33,17 @@ class Ticket:
         response = self.client.request("PUT", _path(ticket_id), json=payload)
         return response
 
+    def bulk_update(self, ticket_ids: list[int], properties: dict[str, Any]) -> Response:
+        """
+        Applies the same properties to up to 100 tickets in one request.
+
+        Note: the server processes this asynchronously and responds 202 with a
+        job reference - per-ticket outcomes are not in the response.
+        """
+        payload = {"bulk_action": {"ids": ticket_ids, "properties": properties}}
+        response = self.client.request("POST", "tickets/bulk_update", json=payload)
+        return response
+
     def delete(self, ticket_id: int) -> Response:
         """Deletes a specific ticket by ID."""
         response = self.client.request("DELETE", _path(ticket_id))
@@ -41,6 +41,13 @@ def main():
         help="Process tickets from the database in random order"
     )
 
+    parser.add_argument(
+        "--cache-policy",
+        action="store",
+        choices=["enabled", "replay", "write-only"],
+        help="Response cache policy for ticket imports (answer repeat payloads without spending API calls)"
+    )
+
     parser.add_argument(
         "--retry-failed",
         action="store_true",
@@ -62,10 +69,10 @@ def main():
             ticket_importer.create_tables()
 
         elif args.run:
-            ticket_importer.run(limit=args.limit, random_order=args.random_order)
+            ticket_importer.run(limit=args.limit, random_order=args.random_order, cache_policy=args.cache_policy)
 
         elif args.retry_failed:
-            ticket_importer.retry_failed()
+            ticket_importer.retry_failed(cache_policy=args.cache_policy)
 
         else:
             print("No arguments provided")